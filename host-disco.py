@@ -3,21 +3,40 @@
 # auto discovery using nets.txt, and default ranges if file is not found.
 # python3 disc-auto.py        # will scan default/network_ranges and nodes in nodes.db
 # python3 disc-auto.py -new   # this will run a new ICMP discovery and build a new nodes.db if not already there
+# python3 host-disco.py -passive  # passive discovery from neighbor tables, only candidates get pinged
+# python3 host-disco.py --profile  # per-phase timings and a sampling profile, see profiler.py
 # 
 # basic ICMP discovery of the specified network.
 #
 # if you use file method, do it like this for multiple ranges:
 # 10.1.1.1-10.1.1.10
 # 10.2.2.1-10.2.2.5
+#
+# passive discovery reads the local neighbor table (/proc/net/arp and ip neigh) and bulk walks
+# ipNetToMediaTable, ipNetToPhysicalTable and the bridge FDB of the SNMP nodes in nodes.db.
+# candidates inside the ranges are pinged once; hosts that don't answer but are fresh in a
+# neighbor table or seen in a switch FDB are saved as ip:ARP so firewall-silent hosts still show up.
 
 import subprocess
 import datetime
+import ipaddress
 from concurrent.futures import ThreadPoolExecutor
 import argparse
+from profiler import add_argument as add_profile_argument, start as start_profile, phase
+from probe import parse_range
 
 DEFAULT_RANGES = ["10.1.1.1-10.1.1.10", "1.0.0.1"]  # Default ranges
 
+IP_NET_TO_MEDIA_PHYS = "1.3.6.1.2.1.4.22.1.2"  # ipNetToMediaPhysAddress.<ifIndex>.<ip>
+IP_NET_TO_PHYSICAL_PHYS = "1.3.6.1.2.1.4.35.1.4"  # ipNetToPhysicalPhysAddress.<ifIndex>.<type>.<len>.<ip>
+DOT1D_TP_FDB_PORT = "1.3.6.1.2.1.17.4.3.1.2"  # dot1dTpFdbPort.<mac>
+FRESH_NEIGH_STATES = {"REACHABLE", "DELAY", "PROBE", "PERMANENT", "NOARP"}
+
 def icmp_discovery(network_range):
+    with phase("icmp sweep"):
+        return sweep_range(network_range)
+
+def sweep_range(network_range):
     discovered_hosts = []
 
     if '-' in network_range:
@@ -51,6 +70,177 @@ def ping_host(ip_address, command):
         print(f"{ip_address} is alive")
         return f"{ip_address}:ICMP"
 
+def in_ranges(ip, network_ranges):
+    try:
+        ip = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    for network_range in network_ranges:
+        if not network_range.strip():
+            continue
+        try:
+            start_ip, end_ip = parse_range(network_range)
+        except ValueError:
+            continue
+        if start_ip.version == ip.version and start_ip <= ip <= end_ip:
+            return True
+    return False
+
+def parse_proc_arp(text):
+    # ip -> (mac, fresh) from /proc/net/arp
+    neighbors = {}
+    for line in text.splitlines()[1:]:  # Skip the header line
+        parts = line.split()
+        if len(parts) >= 4 and int(parts[2], 16) & 0x2:  # ATF_COM, complete entry (0x0 is incomplete)
+            neighbors[parts[0]] = (parts[3].lower(), True)
+    return neighbors
+
+def parse_ip_neigh(text):
+    # ip -> (mac, fresh) from ip neigh show
+    neighbors = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if not parts or "lladdr" not in parts:
+            continue  # FAILED/INCOMPLETE entries have no link layer address
+        mac = parts[parts.index("lladdr") + 1].lower()
+        neighbors[parts[0]] = (mac, parts[-1] in FRESH_NEIGH_STATES)
+    return neighbors
+
+def read_local_neighbors():
+    # ip -> (mac, fresh)
+    neighbors = {}
+    try:
+        with open("/proc/net/arp", 'r') as arp_file:
+            neighbors.update(parse_proc_arp(arp_file.read()))
+    except FileNotFoundError:
+        pass
+
+    try:
+        process = subprocess.run(["ip", "neigh", "show"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        neighbors.update(parse_ip_neigh(process.stdout))
+    except FileNotFoundError:
+        pass  # No iproute2, /proc/net/arp is enough for IPv4
+
+    return neighbors
+
+def format_mac(value):
+    return ":".join(f"{octet:02x}" for octet in bytes(value.asOctets()))
+
+def oid_index(oid, column):
+    # Index part of a table OID as integers, None if it isn't numeric
+    try:
+        return [int(part) for part in oid[len(column) + 1:].split('.')]
+    except ValueError:
+        return None
+
+def media_ip(oid):
+    # ipNetToMediaPhysAddress.<ifIndex>.<a>.<b>.<c>.<d>
+    index = oid_index(oid, IP_NET_TO_MEDIA_PHYS)
+    if index and len(index) == 5 and all(part <= 255 for part in index[1:]):
+        return '.'.join(map(str, index[1:]))
+    return None
+
+def physical_ip(oid):
+    # ipNetToPhysicalPhysAddress.<ifIndex>.<type>.<len>.<address octets>, 4 for IPv4 and 16 for IPv6
+    index = oid_index(oid, IP_NET_TO_PHYSICAL_PHYS)
+    if index and len(index) >= 3 and index[2] == len(index) - 3 and index[2] in (4, 16):
+        try:
+            return str(ipaddress.ip_address(bytes(index[3:])))
+        except ValueError:
+            return None  # Octet over 255
+    return None
+
+def fdb_mac(oid):
+    # dot1dTpFdbPort.<six MAC octets>
+    index = oid_index(oid, DOT1D_TP_FDB_PORT)
+    if index and len(index) == 6 and all(octet <= 255 for octet in index):
+        return ":".join(f"{octet:02x}" for octet in index)
+    return None
+
+def read_snmp_neighbors(snmp_nodes):
+    # Bulk walks the ARP/ND and bridge forwarding tables of routers and switches, returns (neighbors, fdb_macs)
+    try:
+        from snmp import snmp_bulk_walk
+    except ImportError:
+        print("pysnmp not installed, skipping SNMP neighbor tables")
+        return {}, set()
+
+    def walk_node(node):
+        ip, community = node
+        neighbors = {}
+        fdb_macs = set()
+        try:
+            for column, parse in ((IP_NET_TO_MEDIA_PHYS, media_ip), (IP_NET_TO_PHYSICAL_PHYS, physical_ip)):
+                for oid, value in snmp_bulk_walk(ip, community, column):
+                    neighbor_ip = parse(oid)
+                    if neighbor_ip:
+                        neighbors[neighbor_ip] = (format_mac(value), False)
+            for oid, value in snmp_bulk_walk(ip, community, DOT1D_TP_FDB_PORT):
+                mac = fdb_mac(oid)
+                if mac:
+                    fdb_macs.add(mac)
+        except Exception as e:
+            # One broken router must not stop discovery from the others and the local table
+            print(f"SNMP neighbor walk of {ip} failed: {e}")
+            return {}, set()
+        return neighbors, fdb_macs
+
+    neighbors = {}
+    fdb_macs = set()
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        for node_neighbors, node_fdb_macs in executor.map(walk_node, snmp_nodes):
+            for ip, entry in node_neighbors.items():
+                neighbors.setdefault(ip, entry)
+            fdb_macs |= node_fdb_macs
+    return neighbors, fdb_macs
+
+def read_snmp_nodes(file_name="nodes.db"):
+    snmp_nodes = []
+    try:
+        with open(file_name, 'r') as nodes_file:
+            for line in nodes_file:
+                parts = line.strip().split(':')
+                if len(parts) >= 2 and parts[1].upper() == 'SNMP':
+                    snmp_nodes.append((parts[0], parts[2] if len(parts) >= 3 else 'public'))
+    except FileNotFoundError:
+        pass
+    return snmp_nodes
+
+def passive_discovery(network_ranges):
+    with phase("snmp neighbor walk"):
+        neighbors, fdb_macs = read_snmp_neighbors(read_snmp_nodes())
+    with phase("local neighbor table"):
+        neighbors.update(read_local_neighbors())  # Local state is fresher than the SNMP copies
+
+    candidates = {ip: entry for ip, entry in neighbors.items() if in_ranges(ip, network_ranges)}
+    print(f"{len(candidates)} candidate(s) found in neighbor tables")
+
+    discovered_hosts = []
+    with phase("confirm probes"), ThreadPoolExecutor(max_workers=50) as executor:
+        futures = {}
+        for ip in candidates:
+            command = ["ping", "-c", "1", "-W", "1", ip]
+            futures[ip] = executor.submit(ping_host, ip, command)
+
+        for ip, future in futures.items():
+            result = future.result()
+            mac, fresh = candidates[ip]
+            if result:
+                discovered_hosts.append(result)
+            elif fresh or mac in fdb_macs:
+                print(f"{ip} is present (ARP {mac})")
+                discovered_hosts.append(f"{ip}:ARP")
+
+    return discovered_hosts
+
+def read_network_ranges(file_name="nets.txt"):
+    try:
+        with open(file_name, 'r') as file:
+            return [line.strip() for line in file.readlines()]
+    except FileNotFoundError:
+        print("nets.txt file not found. Using default ranges.")
+        return DEFAULT_RANGES
+
 def new_discovery():
     choice = input("Would you like to input a network range(s)? (yes/file/no): ").lower()
     
@@ -83,30 +273,29 @@ def new_discovery():
     return discovered_hosts
 
 def default_discovery():
-    file_name = "nets.txt"
-    try:
-        with open(file_name, 'r') as file:
-            network_ranges = [line.strip() for line in file.readlines()]
-            discovered_hosts = []
-            for network_range in network_ranges:
-                discovered_hosts.extend(icmp_discovery(network_range))
-    except FileNotFoundError:
-        print("nets.txt file not found. Using default ranges.")
-        discovered_hosts = []
-        for network_range in DEFAULT_RANGES:
-            discovered_hosts.extend(icmp_discovery(network_range))
+    discovered_hosts = []
+    for network_range in read_network_ranges():
+        discovered_hosts.extend(icmp_discovery(network_range))
 
     return discovered_hosts
 
 def main():
     parser = argparse.ArgumentParser(description="ICMP network discovery")
     parser.add_argument("-new", action="store_true", help="Enable new discovery")
+    parser.add_argument("-passive", action="store_true", help="Discover from ARP/neighbor tables instead of a full ICMP sweep")
+    add_profile_argument(parser)
     args = parser.parse_args()
+    if args.profile:
+        start_profile(args.profile, "host-disco", args.profile_duration)
 
     if args.new:
         discovered_hosts = new_discovery()
+    elif args.passive:
+        with phase("passive discovery"):
+            discovered_hosts = passive_discovery(read_network_ranges())
     else:
-        discovered_hosts = default_discovery()
+        with phase("discovery sweep"):
+            discovered_hosts = default_discovery()
 
     if not discovered_hosts:
         return
@@ -121,15 +310,18 @@ def main():
     # Read existing hosts from nodes.db file into a set
     existing_hosts = set()
     try:
-        with open("nodes.db", 'r') as nodes_file:
+        with phase("inventory load"), open("nodes.db", 'r') as nodes_file:
             existing_hosts = {line.strip() for line in nodes_file.readlines()}
     except FileNotFoundError:
         pass  # If nodes.db doesn't exist, proceed without existing hosts
 
     # Write to nodes.db file in append mode, avoiding duplicates
     written_hosts = set(existing_hosts)  # Initialize with existing hosts
-    with open("nodes.db", 'a') as nodes_file:
+    known_ips = {host.split(':')[0] for host in existing_hosts}
+    with phase("inventory save"), open("nodes.db", 'a') as nodes_file:
         for host in discovered_hosts:
+            if host.endswith(':ARP') and host.split(':')[0] in known_ips:
+                continue  # Already in the inventory with an active check
             if host not in written_hosts:
                 nodes_file.write(host + '\n')
                 written_hosts.add(host)
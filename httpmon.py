@@ -0,0 +1,151 @@
+# httpmon.py
+#
+# HTTP/HTTPS checks for moni.py and probe.py over pooled keep-alive connections.
+# connections are kept per origin (scheme, host, port) and reused across checks and cycles,
+# so a check is normally one request/response, not a TCP + TLS handshake.
+# if a connection has to be re-established the TLS session of the origin is resumed.
+#
+# nodes.db entries (expected status defaults to 200, body substring is optional):
+# http://10.1.1.4:8080/health
+# https://intranet.example.com/login 200 Sign in
+# https://10.1.1.4/api/status 204
+
+import ssl
+import socket
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+CONNECT_TIMEOUT = 3  # Deadline for TCP connect and TLS handshake
+READ_TIMEOUT = 5  # Deadline for each read of the response
+MAX_BODY = 65536  # Max bytes of the body read for the substring check
+MAX_IDLE = 4  # Idle connections kept per origin
+
+class PooledHTTPConnection(http.client.HTTPConnection):
+    def connect(self):
+        self.sock = socket.create_connection((self.host, self.port), CONNECT_TIMEOUT)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.settimeout(READ_TIMEOUT)
+
+class PooledHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, host, port, context, pool):
+        super().__init__(host, port, context=context)
+        self.pool = pool
+
+    def connect(self):
+        sock = socket.create_connection((self.host, self.port), CONNECT_TIMEOUT)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        origin = ("https", self.host, self.port)
+        session = self.pool.tls_sessions.get(origin)
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host, session=session)
+        self.sock.settimeout(READ_TIMEOUT)
+
+    def getresponse(self):
+        sock = self.sock
+        response = super().getresponse()
+        # Save the session here, a Connection: close response has already dropped self.sock.
+        # TLS 1.3 tickets arrive after the handshake, by now they have been read with the headers
+        if sock is not None:
+            self.pool.tls_sessions[("https", self.host, self.port)] = sock.session
+        return response
+
+class HTTPPool:
+    def __init__(self, verify=False):
+        self.idle = {}  # origin -> [connection, ...]
+        self.tls_sessions = {}  # origin -> ssl.SSLSession
+        self.lock = threading.Lock()
+        self.context = ssl.create_default_context()
+        if not verify:
+            # Monitoring targets are often on IPs or self-signed certs
+            self.context.check_hostname = False
+            self.context.verify_mode = ssl.CERT_NONE
+
+    def get(self, origin):
+        with self.lock:
+            connections = self.idle.get(origin)
+            if connections:
+                return connections.pop(), True
+        scheme, host, port = origin
+        if scheme == "https":
+            return PooledHTTPSConnection(host, port, self.context, self), False
+        return PooledHTTPConnection(host, port), False
+
+    def release(self, origin, connection):
+        with self.lock:
+            connections = self.idle.setdefault(origin, [])
+            if len(connections) < MAX_IDLE:
+                connections.append(connection)
+                return
+        connection.close()
+
+    def request(self, url):
+        # Returns (status, body) with at most MAX_BODY bytes of body
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        origin = (parts.scheme, parts.hostname, port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        headers = {"Host": parts.netloc, "Connection": "keep-alive", "User-Agent": "jnms"}
+
+        while True:
+            connection, reused = self.get(origin)
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                body = response.read(MAX_BODY)
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                connection.close()
+                if not reused:
+                    raise
+                # The server closed an idle keep-alive connection, retry on a fresh one
+            except Exception:
+                connection.close()
+                raise
+
+        if response.will_close or not response.isclosed():
+            # Server won't keep it open, or the body was bigger than MAX_BODY
+            connection.close()
+        else:
+            self.release(origin, connection)
+        return response.status, body
+
+    def close(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for connection in connections:
+                    connection.close()
+            self.idle.clear()
+
+default_pool = HTTPPool()
+
+def parse_http_entry(host_entry):
+    # Raises ValueError for a bad URL or status, so a broken nodes.db line can't stop the monitor
+    parts = host_entry.split(None, 2)
+    url = parts[0]
+    url_parts = urlsplit(url)
+    if url_parts.scheme not in ("http", "https"):
+        raise ValueError(f"unsupported scheme in {url}")
+    if not url_parts.hostname:
+        raise ValueError(f"no host in {url}")
+    url_parts.port  # Raises ValueError for a non-numeric or out of range port
+    expected_status = int(parts[1]) if len(parts) >= 2 else 200
+    body_substring = parts[2] if len(parts) >= 3 else None
+    return url, expected_status, body_substring
+
+def http_monitor(url, expected_status=200, body_substring=None, pool=default_pool):
+    try:
+        status, body = pool.request(url)
+    except (OSError, http.client.HTTPException) as e:
+        print(f"{url} HTTP Failed: {e}")
+        return False
+
+    if status != expected_status:
+        print(f"{url} HTTP Failed: status {status}, expected {expected_status}")
+        return False
+    if body_substring and body_substring.encode() not in body:
+        print(f"{url} HTTP Failed: '{body_substring}' not found")
+        return False
+    print(f"{url} HTTP OK")
+    return True
@@ -1,29 +1,49 @@
 # jnms.py
 # daddy
+#
+# python3 jnms.py --profile   # profile every script, each writes its own report to profile/, see profiler.py
+# python3 jnms.py --profile=timing --profile-duration 600   # the mode and duration are passed on as given
 
+import argparse
 import subprocess
-import sys
+from profiler import add_argument as add_profile_argument, start as start_profile, phase
 
 def main():
-    # Check if the '-new' switch is provided
-    if "-new" in sys.argv:
-        # Remove the '-new' switch from sys.argv
-        sys.argv.remove("-new")
+    # Check if the '--profile' switch is provided, pass it on to every script
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    add_profile_argument(parser)
+    args, rest = parser.parse_known_args()
+    profile_args = []
+    if args.profile:
+        profile_args = [f"--profile={args.profile}"]
+        if args.profile_duration:
+            profile_args += ["--profile-duration", str(args.profile_duration)]
+        start_profile("timing", "jnms", args.profile_duration)
 
+    # Check if the '-new' switch is provided
+    if "-new" in rest:
         # Execute host discovery script with -new switch
-        subprocess.run(["python3", "host-disco.py", "-new"])
+        with phase("host-disco.py"):
+            subprocess.run(["python3", "host-disco.py", "-new"] + profile_args)
+    elif "-passive" in rest:
+        # Passive discovery from ARP/neighbor tables
+        with phase("host-disco.py"):
+            subprocess.run(["python3", "host-disco.py", "-passive"] + profile_args)
     else:
         # Execute host discovery script
-        subprocess.run(["python3", "host-disco.py"])
+        with phase("host-disco.py"):
+            subprocess.run(["python3", "host-disco.py"] + profile_args)
 
     # Execute service discovery script
-    subprocess.run(["python3", "svc-disco.py"])
+    with phase("svc-disco.py"):
+        subprocess.run(["python3", "svc-disco.py"] + profile_args)
 
     # Start SNMP script as a background process
-    snmp_process = subprocess.Popen(["python3", "snmp.py"])
+    snmp_process = subprocess.Popen(["python3", "snmp.py"] + profile_args)
 
     # Execute service discovery script
-    subprocess.run(["python3", "moni.py"])
+    with phase("moni.py"):
+        subprocess.run(["python3", "moni.py"] + profile_args)
 
     # Wait for the SNMP script to finish before exiting (optional)
     snmp_process.wait()
@@ -2,12 +2,20 @@
 #
 # ICMP and TCP, etc, monitors with added functionality to beep once a minute when a node is down.
 # Also includes email alerting functionality using smtp.py
+# Current state of every check is kept in memory and served on http://127.0.0.1:8161, see statusapi.py
 
 import subprocess
 import socket
 import time
 import sys
+import argparse
+from urllib.parse import urlsplit
 from smtp import send_email, sender_email, receiver_email, smtp_server, smtp_port, password
+from probe import read_agents, agent_for_entry
+from services import service_monitor
+from httpmon import http_monitor, parse_http_entry
+from profiler import add_argument as add_profile_argument, start as start_profile, phase
+from statusapi import StatusTable, start_api, API_PORT
 
 # Define constants
 BEEP_ENABLED = True  # Set to True to enable beep, False to disable
@@ -42,7 +50,8 @@ def beep():
 
 def send_alert_email(subject, message):
     if SMTP_ENABLED:
-        send_email(subject, message)
+        with phase("alert send"):
+            send_email(subject, message)
 
 def generate_alert_message(down_nodes):
     subject = "[ALERT] Node(s) Down"
@@ -52,41 +61,88 @@ def generate_alert_message(down_nodes):
     message += "Please check."
     return subject, message
 
+def check_hosts(hosts, agents, table=None):
+    down_nodes = []
+
+    for host_entry in hosts:
+        start = time.perf_counter()
+        if agent_for_entry(host_entry, agents):
+            continue
+        elif host_entry.startswith(('http://', 'https://')):
+            try:
+                url, expected_status, body_substring = parse_http_entry(host_entry)
+            except ValueError as e:
+                print(f"Invalid HTTP check {host_entry}: {e}")
+                continue
+            host, node, check_type = urlsplit(url).hostname, url, "http"
+            ok = http_monitor(url, expected_status, body_substring)
+        elif ':ICMP' in host_entry:
+            host = node = host_entry.split(':')[0]
+            check_type = "icmp"
+            ok = icmp_monitor(host)
+        elif ':SNMP' in host_entry or ':ARP' in host_entry:
+            # Ignore SNMP entries and passively discovered hosts
+            continue
+        else:
+            parts = host_entry.split(':')
+            if len(parts) not in (2, 3):
+                print(f"Invalid format specified for host {host_entry}")
+                continue
+            host, port = parts[0], parts[1]
+            try:
+                port = int(port)
+            except ValueError:
+                print(f"Invalid port {port} specified for host {host}")
+                continue
+            node = f"{host}:{port}"
+            if len(parts) == 3:
+                # Service type found by svc-disco.py, e.g. 10.1.1.4:22:ssh
+                check_type = parts[2]
+                ok = service_monitor(host, port, check_type)
+            else:
+                check_type = "tcp"
+                ok = tcp_monitor(host, port)
+
+        if table is not None:
+            table.update(host_entry, host, check_type, ok, time.perf_counter() - start)
+        if not ok:
+            down_nodes.append(node)
+
+    return down_nodes
+
 def main():
+    parser = argparse.ArgumentParser(description="ICMP, TCP and HTTP monitoring")
+    parser.add_argument('-api', type=int, default=API_PORT, help="Port of the local status API, 0 to disable")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        start_profile(args.profile, "moni", args.profile_duration)
+
+    table = StatusTable()
+    if args.api:
+        try:
+            start_api(table, args.api)
+            print(f"Status API on http://127.0.0.1:{args.api}/status")
+        except OSError as e:
+            print(f"Status API not started on port {args.api}: {e}")
+
     last_email_time = 0
     last_beep_time = 0
 
     while True:
         try:
-            with open('nodes.db', 'r') as file:
+            with phase("inventory load"), open('nodes.db', 'r') as file:
                 hosts = file.read().splitlines()
         except FileNotFoundError:
             print("Error: nodes.db file not found")
             time.sleep(60)
             continue
 
-        down_nodes = []
+        agents = read_agents()  # Entries assigned to remote probe agents are checked by them, see probe.py
 
-        for host_entry in hosts:
-            if ':ICMP' in host_entry:
-                host = host_entry.split(':')[0]
-                if not icmp_monitor(host):
-                    down_nodes.append(host)
-            elif ':SNMP' in host_entry:
-                # Ignore SNMP entries
-                continue
-            else:
-                parts = host_entry.split(':')
-                if len(parts) == 2:
-                    host, port = parts
-                    try:
-                        port = int(port)
-                        if not tcp_monitor(host, port):
-                            down_nodes.append(f"{host}:{port}")
-                    except ValueError:
-                        print(f"Invalid port {port} specified for host {host}")
-                else:
-                    print(f"Invalid format specified for host {host_entry}")
+        with phase("monitor cycle"):
+            down_nodes = check_hosts(hosts, agents, table)
+        table.prune(set(hosts))
 
         current_time = time.time()
         if down_nodes:
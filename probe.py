@@ -0,0 +1,522 @@
+# probe.py
+#
+# remote probe agents that run checks near the targets and batch results back to a central collector.
+# python3 probe.py -collector                      # run the collector on the central host (127.0.0.1:8162)
+# python3 probe.py -collector -b 0.0.0.0 -p 9000   # listen on every interface, port 9000
+# python3 probe.py -collector -b 0.0.0.0 -tlscert collector.pem -tlskey collector.key  # TLS for WAN agents
+# python3 probe.py -agent site1 -s 10.1.1.147      # run agent "site1" reporting to the collector at 10.1.1.147
+# python3 probe.py -agent site1 -s collector.example.com -tlsca collector.pem          # agent over TLS
+# python3 probe.py -agent site1 --profile           # per-phase timings and a sampling profile, see profiler.py
+#
+# agents.txt on the collector assigns slices of nodes.db to agents, one agent per line:
+# site1 10.2.0.1-10.2.255.254
+# site1 10.3.1.0/24
+# site2 192.168.50.7
+#
+# nodes.db entries inside an agent's ranges are handed to that agent and skipped by moni.py.
+# the collector alerts on them instead (beep/email like moni.py): failed results reported by agents,
+# and agents with assigned entries that haven't reported for STALE_CYCLES check intervals.
+# the agent reuses the ICMP/TCP checks from monitors.py and snmp_get from snmp.py, keeps one
+# TCP connection open to the collector and sends zlib compressed JSON batches over it.
+#
+# collector and agents share a secret in probe.key (-k to use another file), e.g.
+# python3 -c "import secrets; print(secrets.token_hex(32))" > probe.key
+# every frame carries an HMAC-SHA256 over the secret, per-connection nonces and a sequence number,
+# so peers without the key get nothing and can't inject or replay results. the HMAC doesn't encrypt,
+# use -tlscert/-tlskey and -tlsca when nodes.db holds SNMP communities and the agents are across the WAN.
+# while the collector is unreachable results are spooled to spool/<agent>/, one file per batch, and sent
+# on reconnect. each file is deleted once the collector acks it, the oldest are dropped past SPOOL_MAX_BYTES.
+
+import os
+import ssl
+import sys
+import hmac
+import json
+import time
+import zlib
+import socket
+import struct
+import hashlib
+import secrets
+import threading
+import argparse
+import datetime
+import ipaddress
+import socketserver
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from monitors import icmp_monitor, tcp_monitor, beep, send_alert_email, generate_alert_message
+from monitors import BEEP_DELAY, EMAIL_DELAY, SMTP_ENABLED
+from services import service_monitor
+from httpmon import http_monitor, parse_http_entry
+from profiler import add_argument as add_profile_argument, start as start_profile, phase
+
+COLLECTOR_PORT = 8162  # TCP port the collector listens on
+CHECK_INTERVAL = 10  # Delay between check cycles on the agent, same as moni.py
+BATCH_SIZE = 500  # Max results per uploaded batch
+REFRESH_CYCLES = 30  # Re-pull the assignment from the collector every N cycles
+STALE_CYCLES = 3  # Alert when an agent with assigned entries hasn't reported for this many cycles
+MAX_WORKERS = 50  # Concurrent checks per agent
+SPOOL_DIR = "spool"
+SPOOL_MAX_BYTES = 100 * 1024 * 1024  # Per agent, oldest batches are dropped beyond this
+CONNECT_TIMEOUT = 5  # Also the deadline for the handshake of a new connection
+REPLY_TIMEOUT = 30  # Deadline for the collector's reply to each agent request, then the agent spools
+IDLE_TIMEOUT = 300  # Collector drops agent connections that send nothing for this long
+MAX_FRAME = 16 * 1024 * 1024  # Max compressed frame size
+MAX_MESSAGE = 64 * 1024 * 1024  # Max decompressed message size
+NONCE_SIZE = 16
+
+class FrameError(ValueError):
+    pass
+
+def read_secret(file_path="probe.key"):
+    try:
+        with open(file_path, 'rb') as f:
+            secret = f.read().strip()
+    except FileNotFoundError:
+        secret = b""
+    if not secret:
+        print(f"Shared secret file {file_path} not found or empty, see probe.py header")
+        sys.exit(1)
+    return secret
+
+def decompress(payload):
+    decompressor = zlib.decompressobj()
+    data = decompressor.decompress(payload, MAX_MESSAGE)
+    if decompressor.unconsumed_tail or not decompressor.eof:
+        raise FrameError("message too large or truncated")
+    return data
+
+def recv_exact(sock, length):
+    data = b""
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    return data
+
+class Channel:
+    # Authenticated frames on one connection: length, HMAC-SHA256, zlib compressed JSON
+    def __init__(self, sock, secret, nonce, side):
+        self.sock = sock
+        self.secret = secret
+        self.nonce = nonce
+        self.send_direction, self.recv_direction = (b"A", b"C") if side == "agent" else (b"C", b"A")
+        self.send_seq = 0
+        self.recv_seq = 0
+
+    def mac(self, direction, seq, payload):
+        return hmac.new(self.secret, self.nonce + direction + struct.pack("!Q", seq) + payload, hashlib.sha256).digest()
+
+    def send(self, message):
+        payload = zlib.compress(json.dumps(message).encode())
+        if len(payload) > MAX_FRAME:
+            raise FrameError("frame too large")
+        digest = self.mac(self.send_direction, self.send_seq, payload)
+        self.sock.sendall(struct.pack("!I", len(payload)) + digest + payload)
+        self.send_seq += 1
+
+    def recv(self):
+        (length,) = struct.unpack("!I", recv_exact(self.sock, 4))
+        if length > MAX_FRAME:
+            raise FrameError("frame too large")
+        digest = recv_exact(self.sock, hashlib.sha256().digest_size)
+        payload = recv_exact(self.sock, length)
+        if not hmac.compare_digest(digest, self.mac(self.recv_direction, self.recv_seq, payload)):
+            raise FrameError("bad frame signature, wrong secret?")
+        self.recv_seq += 1
+        return json.loads(decompress(payload))
+
+def open_channel(sock, secret, side):
+    # Both sides send a random nonce first, so frames from another connection can't be replayed
+    own_nonce = secrets.token_bytes(NONCE_SIZE)
+    sock.sendall(own_nonce)
+    peer_nonce = recv_exact(sock, NONCE_SIZE)
+    nonce = own_nonce + peer_nonce if side == "agent" else peer_nonce + own_nonce
+    return Channel(sock, secret, nonce, side)
+
+def parse_range(network_range):
+    # Accepts 10.1.1.1-10.1.1.10, 10.1.1.0/24 or a single address
+    if '-' in network_range:
+        start_ip, end_ip = network_range.split('-')
+        return ipaddress.ip_address(start_ip.strip()), ipaddress.ip_address(end_ip.strip())
+    network = ipaddress.ip_network(network_range.strip(), strict=False)
+    return network[0], network[-1]
+
+def read_agents(file_path="agents.txt"):
+    agents = {}
+    try:
+        with open(file_path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                parts = line.split()
+                if len(parts) != 2:
+                    print(f"Invalid agent line: {line}")
+                    continue
+                try:
+                    agents.setdefault(parts[0], []).append(parse_range(parts[1]))
+                except ValueError:
+                    print(f"Invalid range {parts[1]} for agent {parts[0]}")
+    except FileNotFoundError:
+        pass
+    return agents
+
+def agent_for_entry(host_entry, agents):
+    try:
+        if host_entry.startswith(('http://', 'https://')):
+            ip = ipaddress.ip_address(urlsplit(host_entry.split()[0]).hostname)
+        else:
+            ip = ipaddress.ip_address(host_entry.split(':')[0])
+    except ValueError:
+        return None
+    for name, ranges in agents.items():
+        for start_ip, end_ip in ranges:
+            if start_ip.version == ip.version and start_ip <= ip <= end_ip:
+                return name
+    return None
+
+def assigned_entries(agent, nodes_file="nodes.db", agents_file="agents.txt"):
+    agents = read_agents(agents_file)
+    try:
+        with open(nodes_file, 'r') as f:
+            hosts = [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+    return [entry for entry in hosts if agent_for_entry(entry, agents) == agent]
+
+def agents_with_entries(nodes_file="nodes.db", agents_file="agents.txt"):
+    agents = read_agents(agents_file)
+    try:
+        with open(nodes_file, 'r') as f:
+            return {agent_for_entry(line.strip(), agents) for line in f if line.strip()} - {None}
+    except FileNotFoundError:
+        return set()
+
+# ---- collector ----
+
+class CollectorHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        agent = None
+        peer = self.client_address[0]
+        try:
+            sock = self.request
+            sock.settimeout(CONNECT_TIMEOUT)
+            if self.server.tls_context:
+                sock = self.server.tls_context.wrap_socket(sock, server_side=True)
+            channel = open_channel(sock, self.server.secret, "collector")
+            message = channel.recv()  # First frame must authenticate within the deadline
+            sock.settimeout(IDLE_TIMEOUT)  # Drop agents that stop sending without closing
+            while True:
+                if message["type"] in ("hello", "pull"):
+                    agent = message["agent"]
+                    with phase("inventory load"):
+                        entries = assigned_entries(agent, self.server.nodes_file, self.server.agents_file)
+                    if message["type"] == "hello":
+                        print(f"Agent {agent} connected from {peer}, {len(entries)} entries assigned")
+                    self.server.assigned(agent, entries)
+                    channel.send({"type": "assign", "entries": entries})
+                elif message["type"] == "results" and agent:
+                    with phase("collector record"):
+                        self.server.record(agent, message["results"])
+                    channel.send({"type": "ack", "count": len(message["results"])})
+                message = channel.recv()
+        except FrameError as e:
+            print(f"Rejected connection from {peer}: {e}")
+        except (ConnectionError, OSError, struct.error, zlib.error, ValueError, KeyError, TypeError):
+            pass
+        if agent:
+            print(f"Agent {agent} disconnected")
+
+class Collector(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, log_file, secret, nodes_file="nodes.db", agents_file="agents.txt", tls_context=None):
+        super().__init__(address, CollectorHandler)
+        self.secret = secret
+        self.tls_context = tls_context
+        self.nodes_file = nodes_file
+        self.agents_file = agents_file
+        self.log = open(log_file, 'a')
+        self.lock = threading.Lock()
+        self.status = {}  # (agent, entry) -> ok of the last result
+        self.last_report = {}  # agent -> time of its last results
+        self.started = time.time()
+        self.last_beep_time = 0
+        self.last_email_time = 0
+
+    def assigned(self, agent, entries):
+        # Forget results for entries the agent no longer has
+        entries = set(entries)
+        with self.lock:
+            for key in [key for key in self.status if key[0] == agent and key[1] not in entries]:
+                del self.status[key]
+
+    def record(self, agent, results):
+        lines = []
+        with self.lock:
+            self.last_report[agent] = time.time()
+            for result in results:
+                self.status[(agent, result["entry"])] = result["ok"]
+        for result in results:
+            now = datetime.datetime.fromtimestamp(result["ts"]).strftime('%Y-%m-%d %H:%M:%S')
+            state = "OK" if result["ok"] else "Failed"
+            lines.append(f"{now} - {agent} - {result['entry']} {state} {result['detail']}".rstrip() + "\n")
+        with self.lock:
+            self.log.writelines(lines)
+            self.log.flush()
+        for line in lines:
+            print(line.strip())
+
+    def down_nodes(self, now=None):
+        now = now or time.time()
+        with self.lock:
+            down_nodes = [f"{entry} (via {agent})" for (agent, entry), ok in self.status.items() if not ok]
+            last_report = dict(self.last_report)
+        for agent in sorted(agents_with_entries(self.nodes_file, self.agents_file)):
+            silent = now - last_report.get(agent, self.started)
+            if silent > STALE_CYCLES * CHECK_INTERVAL:
+                down_nodes.append(f"agent {agent} (no report for {int(silent)} s)")
+        return down_nodes
+
+    def alert(self, down_nodes):
+        # Same beep/email rate limiting as moni.py
+        current_time = time.time()
+        if down_nodes:
+            if current_time - self.last_beep_time >= BEEP_DELAY:
+                beep()
+                self.last_beep_time = current_time
+            if SMTP_ENABLED and current_time - self.last_email_time >= EMAIL_DELAY:
+                subject, message = generate_alert_message(down_nodes)
+                with phase("alert send"):
+                    send_alert_email(subject, message)
+                self.last_email_time = current_time
+
+    def alert_loop(self):
+        while True:
+            time.sleep(CHECK_INTERVAL)
+            try:
+                self.alert(self.down_nodes())
+            except Exception as e:
+                print(f"Alert failed: {e}")  # Keep collecting even if SMTP is down
+
+    def server_close(self):
+        super().server_close()
+        self.log.close()
+
+# ---- agent ----
+
+def run_check(host_entry, snmp_oids):
+    parts = host_entry.split(':')
+    now = time.time()
+    try:
+        if host_entry.startswith(('http://', 'https://')):
+            url, expected_status, body_substring = parse_http_entry(host_entry)
+            return {"ts": now, "entry": host_entry, "ok": http_monitor(url, expected_status, body_substring), "detail": ""}
+        elif ':ICMP' in host_entry:
+            return {"ts": now, "entry": host_entry, "ok": icmp_monitor(parts[0]), "detail": ""}
+        elif ':SNMP' in host_entry:
+            from snmp import snmp_get
+            community = parts[2] if len(parts) >= 3 else 'public'
+            values = [snmp_get(parts[0], community, oid) for oid in snmp_oids]
+            ok = not any(value.startswith("SNMP GET error") for value in values)
+            return {"ts": now, "entry": host_entry, "ok": ok, "detail": "; ".join(values)}
+        elif len(parts) == 2:
+            return {"ts": now, "entry": host_entry, "ok": tcp_monitor(parts[0], int(parts[1])), "detail": ""}
+        elif len(parts) == 3:
+            return {"ts": now, "entry": host_entry, "ok": service_monitor(parts[0], int(parts[1]), parts[2]), "detail": ""}
+    except ValueError:
+        return {"ts": now, "entry": host_entry, "ok": False, "detail": "invalid port or status"}
+    except OSError as e:
+        # Unreachable networks, missing ping binary, etc. count as a failed check
+        print(f"{host_entry} Failed: {e}")
+        return {"ts": now, "entry": host_entry, "ok": False, "detail": str(e)}
+    return {"ts": now, "entry": host_entry, "ok": False, "detail": "invalid format"}
+
+class Agent:
+    def __init__(self, name, server, secret, port=COLLECTOR_PORT, oid_file="oids.txt", spool_dir=SPOOL_DIR,
+                 tls_context=None):
+        self.name = name
+        self.address = (server, port)
+        self.secret = secret
+        self.tls_context = tls_context
+        self.oid_file = oid_file
+        self.snmp_oids = None
+        self.sock = None
+        self.channel = None
+        self.entries = []
+        self.spool_dir = os.path.join(spool_dir, name)
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self.assign_file = os.path.join(spool_dir, f"{name}.assign")
+        self.load_assignment()
+
+    def load_assignment(self):
+        # Last known assignment, so checks keep running if the collector is down at startup
+        try:
+            with open(self.assign_file, 'r') as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.entries = []
+
+    def save_assignment(self, entries):
+        self.entries = entries
+        with open(self.assign_file, 'w') as f:
+            json.dump(entries, f)
+
+    def request(self, message):
+        self.channel.send(message)
+        return self.channel.recv()
+
+    def pull(self, message_type="pull"):
+        reply = self.request({"type": message_type, "agent": self.name})
+        self.save_assignment(reply["entries"])
+
+    def connect(self):
+        if self.sock:
+            return True
+        try:
+            self.sock = socket.create_connection(self.address, timeout=CONNECT_TIMEOUT)
+            if self.tls_context:
+                self.sock = self.tls_context.wrap_socket(self.sock, server_hostname=self.address[0])
+            self.channel = open_channel(self.sock, self.secret, "agent")
+            self.pull("hello")
+            self.sock.settimeout(REPLY_TIMEOUT)  # A collector that stops answering is handled like a lost connection
+            self.flush_spool()
+            print(f"Connected to collector {self.address[0]}:{self.address[1]}, {len(self.entries)} entries assigned")
+            return True
+        except FrameError as e:
+            print(f"Collector rejected: {e}")
+            self.disconnect()
+            return False
+        except (OSError, ConnectionError, struct.error, zlib.error, ValueError):
+            self.disconnect()
+            return False
+
+    def disconnect(self):
+        if self.sock:
+            self.sock.close()
+        self.sock = None
+        self.channel = None
+
+    def spooled_batches(self):
+        return sorted(name for name in os.listdir(self.spool_dir) if name.endswith(".batch"))
+
+    def spool(self, results):
+        batches = self.spooled_batches()
+        seq = int(batches[-1].split('.')[0]) + 1 if batches else 1
+        path = os.path.join(self.spool_dir, f"{seq:012d}.batch")
+        with open(path + ".tmp", 'wb') as f:
+            f.write(zlib.compress(json.dumps(results).encode()))
+        os.replace(path + ".tmp", path)  # A crash never leaves half a batch behind
+        self.trim_spool()
+
+    def trim_spool(self):
+        batches = [os.path.join(self.spool_dir, name) for name in self.spooled_batches()]
+        total = sum(os.path.getsize(path) for path in batches)
+        dropped = 0
+        while total > SPOOL_MAX_BYTES and len(batches) > 1:
+            total -= os.path.getsize(batches[0])
+            os.remove(batches.pop(0))
+            dropped += 1
+        if dropped:
+            print(f"Spool over {SPOOL_MAX_BYTES} bytes, dropped {dropped} oldest batch(es)")
+
+    def flush_spool(self):
+        # One batch in memory at a time, deleted as soon as it's acked so nothing is sent twice
+        for name in self.spooled_batches():
+            path = os.path.join(self.spool_dir, name)
+            try:
+                with open(path, 'rb') as f:
+                    results = json.loads(decompress(f.read()))
+            except (ValueError, zlib.error):
+                print(f"Dropping unreadable spool batch {path}")
+                os.remove(path)
+                continue
+            self.request({"type": "results", "agent": self.name, "results": results})
+            os.remove(path)
+
+    def upload(self, results):
+        # A cycle with nothing to report still sends an empty batch, so the collector knows the agent is alive
+        batches = [results[i:i + BATCH_SIZE] for i in range(0, len(results), BATCH_SIZE)] or [[]]
+        for batch in batches:
+            if self.sock:
+                try:
+                    self.request({"type": "results", "agent": self.name, "results": batch})
+                    continue
+                except (OSError, ConnectionError, struct.error, zlib.error, ValueError):
+                    print("Lost connection to collector, spooling results")
+                    self.disconnect()
+            if batch:
+                self.spool(batch)
+
+    def run_cycle(self, executor):
+        if self.snmp_oids is None and any(':SNMP' in entry for entry in self.entries):
+            from snmp import read_oids
+            self.snmp_oids = read_oids(self.oid_file)
+        snmp_oids = self.snmp_oids or []
+        # ARP entries are passively discovered hosts with nothing to check
+        futures = [executor.submit(run_check, entry, snmp_oids) for entry in self.entries if ':ARP' not in entry]
+        return [future.result() for future in futures]
+
+    def run(self, cycles=None):
+        cycle = 0
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            while cycles is None or cycle < cycles:
+                if self.connect() and cycle and cycle % REFRESH_CYCLES == 0:
+                    try:
+                        self.pull()
+                    except (OSError, ConnectionError, struct.error, zlib.error, ValueError):
+                        self.disconnect()
+                with phase("monitor cycle"):
+                    results = self.run_cycle(executor)
+                with phase("upload"):
+                    self.upload(results)
+                cycle += 1
+                if cycles is None or cycle < cycles:
+                    time.sleep(CHECK_INTERVAL)
+        self.disconnect()
+
+def main():
+    parser = argparse.ArgumentParser(description="Remote probe agent and central collector")
+    parser.add_argument('-collector', action='store_true', help="Run the central collector")
+    parser.add_argument('-agent', type=str, help="Run a probe agent with the given name")
+    parser.add_argument('-s', dest='server', type=str, default='127.0.0.1', help="Collector address for the agent")
+    parser.add_argument('-b', dest='bind', type=str, default='127.0.0.1', help="Address the collector listens on")
+    parser.add_argument('-k', dest='key_file', type=str, default='probe.key', help="Shared secret file")
+    parser.add_argument('-tlscert', type=str, help="Collector TLS certificate (PEM)")
+    parser.add_argument('-tlskey', type=str, help="Collector TLS private key (PEM)")
+    parser.add_argument('-tlsca', type=str, help="CA or collector certificate the agent verifies against (PEM)")
+    parser.add_argument('-p', dest='port', type=int, default=COLLECTOR_PORT, help="Collector TCP port")
+    parser.add_argument('-l', dest='log_file', type=str, default='probe_results.log', help="Collector results log")
+    parser.add_argument('-of', dest='oid_file', type=str, default='oids.txt', help="OID file for SNMP entries")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        start_profile(args.profile, "probe-collector" if args.collector else "probe-agent", args.profile_duration)
+
+    secret = read_secret(args.key_file)
+
+    if args.collector:
+        tls_context = None
+        if args.tlscert:
+            tls_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            tls_context.load_cert_chain(args.tlscert, args.tlskey)
+        with Collector((args.bind, args.port), args.log_file, secret, tls_context=tls_context) as collector:
+            print(f"Collector listening on {args.bind}:{args.port}{' (TLS)' if tls_context else ''}")
+            threading.Thread(target=collector.alert_loop, name="alerts", daemon=True).start()
+            try:
+                collector.serve_forever()
+            except KeyboardInterrupt:
+                pass
+    elif args.agent:
+        tls_context = ssl.create_default_context(cafile=args.tlsca) if args.tlsca else None
+        Agent(args.agent, args.server, secret, args.port, args.oid_file, tls_context=tls_context).run()
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# profiler.py
+#
+# built-in profiling for jnms.py and the scripts it runs, enabled with --profile.
+# python3 moni.py --profile             # phase timings plus a sampling profiler (default, ok for production)
+# python3 moni.py --profile=timing      # phase timings only
+# python3 moni.py --profile=cprofile    # phase timings plus cProfile of the main thread
+# python3 moni.py --profile --profile-duration 300  # write the report after 5 minutes and stop profiling
+#
+# phases are timed with phase("name") blocks in the scripts (discovery sweep, scan, inventory load,
+# monitor cycle, snmp poll, alert send, ...). wall time is per phase, cpu time is the thread's own,
+# so work a phase hands to other threads shows up in its wall time only.
+# the report is printed and written to profile/<script>_<timestamp>.txt, together with
+# profile/<script>_<timestamp>.collapsed in the folded format flamegraph.pl / speedscope read.
+# sample mode folds the sampled stacks, the other modes fold the phase tree.
+# it is written once: at exit (SIGTERM included), after --profile-duration, or on SIGUSR1
+# (kill -USR1 <pid>) for scripts that run until killed, like moni.py and snmp.py.
+
+import os
+import sys
+import time
+import atexit
+import signal
+import datetime
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+SAMPLE_INTERVAL = 0.01  # 100 samples per second
+PROFILE_DIR = "profile"
+
+enabled = False
+phase_stats = defaultdict(lambda: [0, 0.0, 0.0, 0.0])  # name -> [calls, wall, cpu, max wall]
+phase_stacks = defaultdict(float)  # "outer;inner" -> self wall time
+samples = defaultdict(int)  # folded stack -> sample count
+local = threading.local()
+lock = threading.Lock()
+state = {"top_level": 0.0}  # top_level is the wall time spent inside outermost phases
+
+def add_argument(parser):
+    parser.add_argument('-profile', '--profile', nargs='?', const='sample', choices=['timing', 'sample', 'cprofile'],
+                        help="Record per-phase timings, optionally with a sampling or cProfile collector")
+    parser.add_argument('-profile-duration', '--profile-duration', type=float, metavar='SECONDS',
+                        help="Write the profile report after this many seconds instead of at exit")
+
+@contextmanager
+def phase(name):
+    if not enabled:
+        yield
+        return
+
+    stack = getattr(local, "stack", None)
+    if stack is None:
+        stack = local.stack = [[state["name"], 0.0]]
+    stack.append([name, 0.0])  # [name, time spent in child phases]
+    start_wall = time.perf_counter()
+    start_cpu = time.thread_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - start_wall
+        cpu = time.thread_time() - start_cpu
+        path = ";".join(entry[0] for entry in stack)
+        children = stack.pop()[1]
+        stack[-1][1] += wall
+        with lock:
+            stats = phase_stats[name]
+            stats[0] += 1
+            stats[1] += wall
+            stats[2] += cpu
+            stats[3] = max(stats[3], wall)
+            phase_stacks[path] += wall - children
+            if len(stack) == 1:
+                state["top_level"] += wall
+
+def sampler(interval, stop):
+    me = threading.get_ident()
+    while not stop.wait(interval):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            with lock:
+                samples[";".join(reversed(stack))] += 1
+
+def exit_on_sigterm(signum, frame):
+    # Turn SIGTERM into a normal exit so atexit writes the report
+    sys.exit(128 + signum)
+
+def report_on_signal(signum, frame):
+    # Never report from the handler itself, the interrupted main thread may hold the lock
+    threading.Thread(target=report, name="profiler report", daemon=True).start()
+
+def start(mode, name, duration=None):
+    global enabled
+    enabled = True
+    state.update(top_level=0.0, mode=mode, name=name, wall=time.perf_counter(), cpu=time.process_time(), reported=False)
+
+    if mode == "sample":
+        stop = threading.Event()
+        state["stop"] = stop
+        state["sampler"] = threading.Thread(target=sampler, args=(SAMPLE_INTERVAL, stop), name="profiler", daemon=True)
+        state["sampler"].start()
+    elif mode == "cprofile":
+        import cProfile
+        state["cprofile"] = cProfile.Profile()
+        state["cprofile"].enable()
+
+    atexit.register(report)
+    if threading.current_thread() is threading.main_thread():
+        if signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+            signal.signal(signal.SIGTERM, exit_on_sigterm)
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, report_on_signal)
+    if duration:
+        timer = threading.Timer(duration, report)
+        timer.daemon = True
+        timer.start()
+
+def report():
+    global enabled
+    with lock:
+        if state["reported"]:
+            return
+        state["reported"] = True
+        enabled = False
+
+    if "stop" in state:
+        # Samples are copied under the lock below, the timeout only keeps a stuck sampler from hanging the exit
+        state["stop"].set()
+        state["sampler"].join(timeout=1)
+    if "cprofile" in state:
+        state["cprofile"].disable()
+
+    total_wall = time.perf_counter() - state["wall"]
+    total_cpu = time.process_time() - state["cpu"]
+    lines = [f"{state['name']} profile ({state['mode']}): {total_wall:.3f} s wall, {total_cpu:.3f} s cpu",
+             f"{'phase':<28} {'calls':>7} {'wall s':>10} {'thread cpu s':>13} {'avg ms':>10} {'max ms':>10} {'% wall':>7}"]
+    with lock:
+        for name, (calls, wall, cpu, max_wall) in sorted(phase_stats.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{name:<28} {calls:>7} {wall:>10.3f} {cpu:>13.3f} {wall / calls * 1000:>10.1f} "
+                         f"{max_wall * 1000:>10.1f} {wall / total_wall * 100 if total_wall else 0:>6.1f}%")
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, f"{state['name']}_" + datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+
+    if "cprofile" in state:
+        import io
+        import pstats
+        state["cprofile"].dump_stats(base + ".prof")
+        out = io.StringIO()
+        pstats.Stats(state["cprofile"], stream=out).sort_stats("cumulative").print_stats(15)
+        lines.append(out.getvalue())
+        lines.append(f"cProfile data saved to {base}.prof")
+
+    with lock:
+        stacks = dict(samples)
+        if not stacks:
+            # Phase tree in microseconds, the time outside any phase goes to the script itself
+            outside = total_wall - state["top_level"]
+            stacks = {stack: int(wall * 1000000) for stack, wall in phase_stacks.items()}
+            stacks[state["name"]] = stacks.get(state["name"], 0) + int(max(outside, 0.0) * 1000000)
+    with open(base + ".collapsed", 'w') as f:
+        for stack, count in stacks.items():
+            if count > 0:
+                f.write(f"{stack} {count}\n")
+
+    lines.append(f"Collapsed stacks saved to {base}.collapsed")
+    with open(base + ".txt", 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    print("\n".join(lines), file=sys.stderr)
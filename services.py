@@ -0,0 +1,88 @@
+# services.py
+#
+# service fingerprinting for svc-disco.py and protocol-aware checks for moni.py and probe.py.
+# identify_service() works on the socket that was just used to find the port open, so it costs no extra connect.
+# TLS ports get a ClientHello. every other port gets an HTTP HEAD right away, servers that talk first
+# (SSH/SMTP/FTP/POP3/IMAP) still answer with their greeting. only on the usual greeting ports does it
+# wait briefly for the greeting before sending the HEAD, so a silent port costs at most PROBE_TIMEOUT.
+#
+# nodes.db entries with a service type look like:
+# 10.1.1.4:22:ssh
+# 10.1.1.4:443:tls
+
+import ssl
+import socket
+
+BANNER_TIMEOUT = 0.3  # Read deadline for a server greeting
+PROBE_TIMEOUT = 0.5  # Read deadline for the probe response
+TLS_PORTS = {443, 465, 636, 853, 990, 993, 995, 8443}
+GREETING_PORTS = {21, 22, 25, 110, 143, 587, 2222}  # Sending HEAD first could confuse these
+HTTP_PROBE = b"HEAD / HTTP/1.0\r\n\r\n"
+
+def read_some(sock, timeout):
+    sock.settimeout(timeout)
+    try:
+        return sock.recv(1024)
+    except (socket.timeout, OSError):
+        return b""
+
+def tls_client_hello():
+    # Let the ssl module build a real ClientHello without needing a socket
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    incoming, outgoing = ssl.MemoryBIO(), ssl.MemoryBIO()
+    tls = context.wrap_bio(incoming, outgoing)
+    try:
+        tls.do_handshake()
+    except ssl.SSLWantReadError:
+        pass
+    return outgoing.read()
+
+def classify_banner(banner, port):
+    if banner.startswith(b"SSH-"):
+        return "ssh"
+    if banner.startswith(b"+OK"):
+        return "pop3"
+    if banner.startswith(b"* OK"):
+        return "imap"
+    if banner.startswith(b"220"):
+        if port == 21 or b"FTP" in banner.upper():
+            return "ftp"
+        return "smtp"
+    if banner.startswith(b"HTTP/"):
+        return "http"
+    if banner[:1] == b"\x16" or banner.startswith(b"\x15\x03"):
+        return "tls"
+    return None
+
+def identify_service(sock, port):
+    if port in TLS_PORTS:
+        sock.sendall(tls_client_hello())
+        return classify_banner(read_some(sock, PROBE_TIMEOUT), port)
+
+    if port in GREETING_PORTS:
+        banner = read_some(sock, BANNER_TIMEOUT)
+        if banner:
+            return classify_banner(banner, port)
+
+    sock.sendall(HTTP_PROBE)
+    return classify_banner(read_some(sock, PROBE_TIMEOUT), port)
+
+def service_monitor(host, port, service, timeout=5):
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            if service == "tls":
+                sock.sendall(tls_client_hello())
+                response = read_some(sock, timeout)
+            elif service == "http":
+                sock.sendall(HTTP_PROBE)
+                response = read_some(sock, timeout)
+            else:
+                response = read_some(sock, timeout)
+            ok = classify_banner(response, port) == service
+    except OSError:
+        ok = False
+
+    print(f"{host}:{port} {service.upper()} {'OK' if ok else 'Failed'}")
+    return ok
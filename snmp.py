@@ -16,23 +16,30 @@
 #
 # and/else it will use oids.txt by default
 # oids can be in local dir or /oid sub.
+#
+# python3 snmp.py --profile   # per-phase timings (engine setup, each poll) and a sampling profile, see profiler.py
 
 import datetime
 import time
 import argparse
 import os
 from pysnmp.hlapi import *
+from profiler import add_argument as add_profile_argument, start as start_profile, phase
+from statusapi import push_snmp_values, API_PORT
 
 def snmp_get(ip, community, oid):
-    errorIndication, errorStatus, errorIndex, varBinds = next(
-        getCmd(
-            SnmpEngine(),
-            CommunityData(community),
-            UdpTransportTarget((ip, 161)),
-            ContextData(),
-            ObjectType(ObjectIdentity(oid))
+    with phase("snmp engine setup"):
+        engine = SnmpEngine()
+    with phase("snmp poll"):
+        errorIndication, errorStatus, errorIndex, varBinds = next(
+            getCmd(
+                engine,
+                CommunityData(community),
+                UdpTransportTarget((ip, 161)),
+                ContextData(),
+                ObjectType(ObjectIdentity(oid))
+            )
         )
-    )
     
     if errorIndication:
         return f"SNMP GET error for {ip}: {errorIndication}"
@@ -42,16 +49,41 @@ def snmp_get(ip, community, oid):
         for oid, value in varBinds:
             return f"{oid} = {value.prettyPrint() if value else 'N/A'}"
 
-def monitor_device(ip, community, default_oids, custom_oids, interval, log_file):
+def snmp_bulk_walk(ip, community, oid, max_repetitions=50):
+    # GETBULK walk of a single table column, returns [(oid, value), ...]
+    results = []
+    for errorIndication, errorStatus, errorIndex, varBinds in bulkCmd(
+            SnmpEngine(),
+            CommunityData(community),
+            UdpTransportTarget((ip, 161)),
+            ContextData(),
+            0, max_repetitions,
+            ObjectType(ObjectIdentity(oid)),
+            lexicographicMode=False):
+        if errorIndication or errorStatus:
+            break
+        for name, value in varBinds:
+            results.append((str(name), value))
+    return results
+
+def monitor_device(ip, community, default_oids, custom_oids, interval, log_file, entry=None, api_port=API_PORT):
     with open(log_file, 'a') as f:
         while True:
             now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            values = {}
+            ok = True
             for oid in default_oids + custom_oids:
                 result = snmp_get(ip, community, oid)
                 log_entry = f"{now} - {result}\n"
                 print(log_entry.strip())
                 f.write(log_entry)
                 f.flush()  # Ensure data is written to the file immediately
+                values[oid] = result.split(" = ", 1)[1] if " = " in result else result
+                if result.startswith("SNMP GET error"):
+                    ok = False
+            if api_port:
+                # Latest values for moni.py's status API, under the same nodes.db entry moni.py knows
+                push_snmp_values(entry or f"{ip}:SNMP", ip, values, ok, api_port)
             time.sleep(interval)
 
 def read_nodes_db(file_path):
@@ -63,7 +95,7 @@ def read_nodes_db(file_path):
                 ip = parts[0]
                 community = parts[2] if len(parts) >= 3 else 'public'
                 custom_oid_file = parts[3] if len(parts) >= 4 else None
-                snmp_nodes[ip] = (community, custom_oid_file)
+                snmp_nodes[ip] = (community, custom_oid_file, line.strip())
     return snmp_nodes
 
 def read_oids(file_path):
@@ -101,14 +133,19 @@ def main():
     parser.add_argument('-i', dest='interval', type=int, default=default_interval, help='Interval for SNMP monitoring in seconds')
     parser.add_argument('-l', dest='log_file', type=str, default=default_log_file, help='Log file for SNMP monitoring')
     parser.add_argument('-of', dest='oid_file', type=str, default=default_oid_file, help='OID file for SNMP monitoring')
+    parser.add_argument('-api', type=int, default=API_PORT, help="Port of moni.py's status API, 0 to disable")
+    add_profile_argument(parser)
     args = parser.parse_args()
+    if args.profile:
+        start_profile(args.profile, "snmp", args.profile_duration)
 
-    snmp_nodes = read_nodes_db(args.file_path)
+    with phase("inventory load"):
+        snmp_nodes = read_nodes_db(args.file_path)
 
-    for ip, (community, custom_oid_file) in snmp_nodes.items():
+    for ip, (community, custom_oid_file, entry) in snmp_nodes.items():
         default_oids = read_oids(args.oid_file)
         custom_oids = read_oids(custom_oid_file) if custom_oid_file else []
-        monitor_device(ip, community, default_oids, custom_oids, args.interval, args.log_file)
+        monitor_device(ip, community, default_oids, custom_oids, args.interval, args.log_file, entry, args.api)
 
 if __name__ == "__main__":
     main()
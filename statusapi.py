@@ -0,0 +1,159 @@
+# statusapi.py
+#
+# in-memory status table for moni.py, served as JSON on a local HTTP port (127.0.0.1:8161 by default).
+# dashboards and scripts query it instead of tailing moni.py output or snmp_monitor.log.
+#
+# curl http://127.0.0.1:8161/status                         # every check
+# curl 'http://127.0.0.1:8161/status?status=down&type=tcp'  # filter by host, status and/or type
+# curl 'http://127.0.0.1:8161/changes?since=42&timeout=30'  # long-poll for status changes after version 42
+#
+# each check has: check, host, type, status (up/down/removed), since, last_check, last_rtt_ms, snmp.
+# the table version goes up on every status change, /changes returns the checks changed after "since".
+# snmp.py pushes its latest values with POST /snmp, so they show up without reading the log.
+# the SNMP check is keyed by its nodes.db entry (10.1.1.147:SNMP:string:qnap.txt) and is down
+# while any GET of the last poll failed, like the SNMP checks of probe.py agents.
+
+import json
+import time
+import bisect
+import threading
+import urllib.request
+from collections import defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+API_HOST = "127.0.0.1"  # Local only
+API_PORT = 8161
+MAX_CHANGES = 10000  # Status changes remembered for /changes
+MAX_WAIT = 60  # Longest /changes long-poll in seconds
+
+class StatusTable:
+    def __init__(self):
+        self.checks = {}  # check -> record
+        self.by_host = defaultdict(set)  # host -> {check, ...}
+        self.version = 0
+        self.changes = []  # [(version, check), ...] in version order
+        self.changed = threading.Condition()
+
+    def record_change(self, record):
+        self.version += 1
+        record["version"] = self.version
+        self.changes.append((self.version, record["check"]))
+        if len(self.changes) > MAX_CHANGES:
+            del self.changes[:len(self.changes) - MAX_CHANGES]
+
+    def update(self, check, host, check_type, ok, rtt=None):
+        now = time.time()
+        status = "up" if ok else "down"
+        with self.changed:
+            record = self.checks.get(check)
+            if record is None:
+                record = self.checks[check] = {"check": check, "host": host, "type": check_type, "snmp": {}}
+                self.by_host[host].add(check)
+            record["last_check"] = now
+            record["last_rtt_ms"] = round(rtt * 1000, 1) if rtt is not None else None
+            if record.get("status") != status:
+                record["status"] = status
+                record["since"] = now
+                self.record_change(record)
+                self.changed.notify_all()
+
+    def update_snmp(self, check, host, values, ok):
+        # Result of an snmp.py poll, the latest values are kept on the check
+        with self.changed:
+            self.update(check, host, "snmp", ok)
+            self.checks[check]["snmp"].update(values)
+
+    def prune(self, checks):
+        # Drops checks that are no longer in nodes.db
+        with self.changed:
+            for check in [check for check in self.checks if check not in checks]:
+                record = self.checks.pop(check)
+                self.by_host[record["host"]].discard(check)
+                self.record_change(record)
+            self.changed.notify_all()
+
+    def query(self, host=None, status=None, check_type=None):
+        with self.changed:
+            checks = self.by_host.get(host, ()) if host else self.checks
+            records = [dict(self.checks[check]) for check in checks]
+            version = self.version
+        records = [record for record in records
+                   if (not status or record["status"] == status) and (not check_type or record["type"] == check_type)]
+        return {"version": version, "checks": records}
+
+    def changes_since(self, since, timeout=0):
+        with self.changed:
+            if since <= self.version:
+                self.changed.wait_for(lambda: self.version > since, timeout=min(timeout, MAX_WAIT))
+            version = self.version
+            if since > version or (self.changes and since < self.changes[0][0] - 1):
+                # From before a restart or older than what we remember, the client has to reload everything
+                return {"version": version, "reset": True, "checks": [dict(record) for record in self.checks.values()]}
+            start = bisect.bisect_right(self.changes, since, key=lambda change: change[0])
+            latest = {}
+            for change_version, check in self.changes[start:]:
+                latest[check] = change_version
+            records = []
+            for check in latest:
+                if check in self.checks:
+                    records.append(dict(self.checks[check]))
+                else:
+                    records.append({"check": check, "status": "removed", "version": latest[check]})
+        return {"version": version, "reset": False, "checks": records}
+
+class StatusHandler(BaseHTTPRequestHandler):
+    def send_json(self, code, data):
+        body = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        try:
+            if url.path == "/status":
+                self.send_json(200, self.server.table.query(params.get("host"), params.get("status"), params.get("type")))
+            elif url.path == "/changes":
+                since = int(params.get("since", 0))
+                timeout = float(params.get("timeout", 0))
+                self.send_json(200, self.server.table.changes_since(since, timeout))
+            else:
+                self.send_json(404, {"error": "unknown endpoint, use /status or /changes"})
+        except ValueError:
+            self.send_json(400, {"error": "since and timeout must be numbers"})
+
+    def do_POST(self):
+        if urlsplit(self.path).path != "/snmp":
+            self.send_json(404, {"error": "unknown endpoint"})
+            return
+        try:
+            data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            self.server.table.update_snmp(data["check"], data["host"], dict(data["values"]), bool(data["ok"]))
+        except (ValueError, KeyError, TypeError):
+            self.send_json(400, {"error": "expected {\"check\": ..., \"host\": ..., \"values\": {...}, \"ok\": ...}"})
+            return
+        self.send_json(200, {"version": self.server.table.version})
+
+    def log_message(self, format, *args):
+        pass  # Keep moni.py output readable
+
+def start_api(table, port=API_PORT, host=API_HOST):
+    server = ThreadingHTTPServer((host, port), StatusHandler)
+    server.daemon_threads = True
+    server.table = table
+    threading.Thread(target=server.serve_forever, name="statusapi", daemon=True).start()
+    return server
+
+def push_snmp_values(check, host, values, ok, port=API_PORT):
+    # Used by snmp.py, does nothing if moni.py isn't running
+    data = {"check": check, "host": host, "values": values, "ok": ok}
+    request = urllib.request.Request(f"http://{API_HOST}:{port}/snmp", data=json.dumps(data).encode(),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        urllib.request.urlopen(request, timeout=1).close()
+    except OSError:
+        pass
@@ -7,6 +7,7 @@
 # python3 svc-disco2.py -new          # Runs a guided menu for network range input and port scan
 # python3 svc-disco2.py -scan my_nets.txt  # Scans IP ranges listed in my_nets.txt for open ports   !need a port config line at top
 # python3 svc-disco2.py -scan my_nets.txt -p 1-1024 # Scans IP ranges listed in my_nets.txt for open ports with specified port range
+# python3 svc-disco.py --profile        # per-phase timings and a sampling profile, see profiler.py
 #
 # Script behavior:
 # - Builds nodes.db with discovered hosts
@@ -16,6 +17,8 @@
 # - Supports specifying port range in command line arguments
 # - Supports port range configuration in the my_nets.txt file
 # - Saves port scan results to nodes.db and a timestamped disco file
+# - Identifies the service on each open port (banner or one probe on the same socket, see services.py)
+#   and saves it as host:port:service so moni.py can run protocol-aware checks
 
 import os
 import sys
@@ -23,10 +26,14 @@ import socket
 import threading
 import argparse
 import datetime
+from concurrent.futures import ThreadPoolExecutor
+from services import identify_service
+from profiler import add_argument as add_profile_argument, start as start_profile, phase
 
 # Define the default port range in the configuration
 DEFAULT_PORTS = "1-100"
 DEFAULT_RANGE = "10.1.1.1-10.1.1.20"  # You can adjust this as needed
+FINGERPRINT_WORKERS = 64  # Open ports fingerprinted at once, the port loops don't wait on them
 
 def build_nodes_db():
     existing_entries = set()
@@ -70,6 +77,8 @@ def build_nodes_db():
 def port_scan(hosts, ports):
     open_ports = []
     lock = threading.Lock()
+    fingerprint_pool = ThreadPoolExecutor(max_workers=FINGERPRINT_WORKERS)
+    in_flight = threading.BoundedSemaphore(FINGERPRINT_WORKERS * 2)  # Caps sockets waiting for the pool
 
     # Parse ports input
     if '-' in ports:
@@ -78,6 +87,18 @@ def port_scan(hosts, ports):
     else:
         ports_to_scan = [int(ports)]
 
+    # Identify the service on the connection that found the port open, then close it
+    def fingerprint(s, host, port):
+        try:
+            service = identify_service(s, port)
+        except socket.error:
+            service = None
+        finally:
+            s.close()
+            in_flight.release()
+        with lock:
+            open_ports.append((host, port, service))
+
     # Define a function to scan ports for a single host
     def scan_ports_single_host(host):
         for port in ports_to_scan:
@@ -89,13 +110,12 @@ def port_scan(hosts, ports):
                 # Attempt to connect to the host and port
                 result = s.connect_ex((host, port))
                 
-                # Check if the port is open
+                # Check if the port is open, and fingerprint it on the same connection
                 if result == 0:
-                    with lock:
-                        open_ports.append((host, port))
-                
-                # Close the socket
-                s.close()
+                    in_flight.acquire()
+                    fingerprint_pool.submit(fingerprint, s, host, port)
+                else:
+                    s.close()
             except socket.error:
                 pass  # Could not connect to host
 
@@ -107,11 +127,38 @@ def port_scan(hosts, ports):
         threads.append(thread)
 
     # Wait for all threads to complete
-    for thread in threads:
-        thread.join()
+    with phase("scan"):
+        for thread in threads:
+            thread.join()
+        fingerprint_pool.shutdown(wait=True)
 
     return open_ports
 
+def format_port(host, port, service):
+    return f"{host}:{port}:{service}" if service else f"{host}:{port}"
+
+def save_open_ports(open_ports, file_path="nodes.db"):
+    # Appends new host:port[:service] entries, and adds the service type to bare host:port entries
+    with phase("inventory load"), open(file_path, 'r') as db_file:
+        entries = [line.strip() for line in db_file if line.strip()]
+
+    found = {f"{host}:{port}": format_port(host, port, service) for host, port, service in open_ports}
+    known = set()
+    for i, entry in enumerate(entries):
+        parts = entry.split(':')
+        key = ':'.join(parts[:2])
+        if key in found:
+            known.add(key)
+            if len(parts) == 2:
+                entries[i] = found[key]
+
+    entries.extend(entry for key, entry in found.items() if key not in known)
+    with phase("inventory save"):
+        with open(file_path + ".tmp", 'w') as db_file:
+            for entry in entries:
+                db_file.write(f"{entry}\n")
+        os.replace(file_path + ".tmp", file_path)  # moni.py never reads a half written nodes.db
+
 def get_user_input():
     user_input = input("Do you want to specify ports to scan? (yes/no): ").lower()
     if user_input == 'yes':
@@ -147,7 +194,10 @@ def main():
         parser.add_argument('-new', action='store_true', help="Run in guided mode")
         parser.add_argument('-scan', type=str, help="Scan using the specified file")
         parser.add_argument('-p', '--port', type=str, help="Specify port range")
+        add_profile_argument(parser)
         args = parser.parse_args()
+        if args.profile:
+            start_profile(args.profile, "svc-disco", args.profile_duration)
         
         # Write the command-line arguments to the log file
         log_file.write(f"Command-line arguments: {sys.argv}\n")
@@ -157,9 +207,10 @@ def main():
             build_nodes_db()
             discovered_hosts = set()
             try:
-                with open("nodes.db", 'r') as db_file:
+                with phase("inventory load"), open("nodes.db", 'r') as db_file:
                     for line in db_file:
-                        discovered_hosts.add(line.strip().split(":")[0])
+                        if not line.startswith(('http://', 'https://')):  # URL checks aren't hosts to scan
+                            discovered_hosts.add(line.strip().split(":")[0])
             except FileNotFoundError:
                 log_file.write("nodes.db file not found.\n")
                 print("nodes.db file not found.")
@@ -169,15 +220,10 @@ def main():
 
             if open_ports:
                 log_file.write("Port scanning complete.\n")
-                with open("nodes.db", 'r+') as db_file:
-                    existing_entries = set(line.strip() for line in db_file)
-                    for host, port in open_ports:
-                        result = f"{host}:{port}"
-                        if result not in existing_entries:
-                            db_file.write(f"{result}\n")
-                for host, port in open_ports:
-                    log_file.write(f"{host}:{port}\n")
-                    print(f"{host}:{port}")
+                save_open_ports(open_ports)
+                for host, port, service in open_ports:
+                    log_file.write(f"{format_port(host, port, service)}\n")
+                    print(format_port(host, port, service))
             else:
                 log_file.write("No open ports found.\n")
                 print("No open ports found.")
@@ -211,9 +257,9 @@ def main():
                             else:
                                 log_file.write("Port scanning complete.\n")
                                 print("Port scanning complete.")
-                                for host, port in discovered_hosts:
-                                    log_file.write(f"{host}:{port}\n")
-                                    print(f"{host}:{port}")
+                                for host, port, service in discovered_hosts:
+                                    log_file.write(f"{format_port(host, port, service)}\n")
+                                    print(format_port(host, port, service))
             except FileNotFoundError:
                 log_file.write(f"File {args.scan} not found.\n")
                 print(f"File {args.scan} not found.")
@@ -225,8 +271,9 @@ def main():
         else:
             # If no option is specified, proceed with default behavior
             try:
-                with open("nodes.db", 'r') as db_file:
-                    discovered_hosts = set(line.strip().split(":")[0] for line in db_file)
+                with phase("inventory load"), open("nodes.db", 'r') as db_file:
+                    discovered_hosts = set(line.strip().split(":")[0] for line in db_file
+                                           if not line.startswith(('http://', 'https://')))
             except FileNotFoundError:
                 log_file.write("nodes.db file not found.\n")
                 print("nodes.db file not found.")
@@ -236,9 +283,9 @@ def main():
 
             if open_ports:
                 log_file.write("Port scanning complete.\n")
-                for host, port in open_ports:
-                    log_file.write(f"{host}:{port}\n")
-                    print(f"{host}:{port}")
+                for host, port, service in open_ports:
+                    log_file.write(f"{format_port(host, port, service)}\n")
+                    print(format_port(host, port, service))
             else:
                 log_file.write("No open ports found.\n")
                 print("No open ports found.")
@@ -0,0 +1,8 @@
+# tests/conftest.py
+#
+# the scripts live in the repo root, make them importable from the tests.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,85 @@
+# tests/test_host_disco.py
+#
+# passive discovery parsing: neighbor table OID indexes, ip neigh and /proc/net/arp output,
+# and a failing SNMP node. host-disco.py has a dash in its name, so it is imported with importlib.
+
+import importlib
+import sys
+import types
+
+host_disco = importlib.import_module("host-disco")
+
+MEDIA = host_disco.IP_NET_TO_MEDIA_PHYS
+PHYSICAL = host_disco.IP_NET_TO_PHYSICAL_PHYS
+FDB = host_disco.DOT1D_TP_FDB_PORT
+
+PROC_ARP = """\
+IP address       HW type     Flags       HW address            Mask     Device
+10.1.1.1         0x1         0x2         00:11:22:33:44:55     *        eth0
+10.1.1.2         0x1         0x0         00:00:00:00:00:00     *        eth0
+10.1.1.3         0x1         0x6         AA:BB:CC:DD:EE:FF     *        eth0
+"""
+
+IP_NEIGH = """\
+10.1.1.1 dev eth0 lladdr 00:11:22:33:44:55 REACHABLE
+10.1.1.4 dev eth0 lladdr 00:11:22:33:44:66 STALE
+10.1.1.5 dev eth0  FAILED
+10.1.1.6 dev eth0 lladdr 00:11:22:33:44:77 PERMANENT
+fe80::1 dev eth0 lladdr 00:11:22:33:44:88 router DELAY
+"""
+
+class FakeOctets:
+    def __init__(self, octets):
+        self.octets = octets
+
+    def asOctets(self):
+        return self.octets
+
+def test_media_ip():
+    assert host_disco.media_ip(f"{MEDIA}.3.10.1.1.7") == "10.1.1.7"
+    assert host_disco.media_ip(f"{MEDIA}.3.10.1.1") is None
+    assert host_disco.media_ip(f"{MEDIA}.3.10.1.1.300") is None
+    assert host_disco.media_ip(f"{MEDIA}.3.10.1.x.7") is None
+
+def test_physical_ip():
+    assert host_disco.physical_ip(f"{PHYSICAL}.3.1.4.10.1.1.7") == "10.1.1.7"
+    assert host_disco.physical_ip(f"{PHYSICAL}.3.2.16.254.128" + ".0" * 13 + ".1") == "fe80::1"
+    assert host_disco.physical_ip(f"{PHYSICAL}.3.1.4.10.1.1") is None  # Length doesn't match the octets
+    assert host_disco.physical_ip(f"{PHYSICAL}.3.1.4.10.1.1.256") is None
+    assert host_disco.physical_ip(f"{PHYSICAL}.3.1.5.10.1.1.7.1") is None
+
+def test_fdb_mac():
+    assert host_disco.fdb_mac(f"{FDB}.0.17.34.51.68.85") == "00:11:22:33:44:55"
+    assert host_disco.fdb_mac(f"{FDB}.0.17.34.51.68") is None
+    assert host_disco.fdb_mac(f"{FDB}.0.17.34.51.68.300") is None
+
+def test_parse_proc_arp():
+    assert host_disco.parse_proc_arp(PROC_ARP) == {
+        "10.1.1.1": ("00:11:22:33:44:55", True),
+        "10.1.1.3": ("aa:bb:cc:dd:ee:ff", True),  # ATF_COM | ATF_PERM
+    }
+
+def test_parse_ip_neigh():
+    assert host_disco.parse_ip_neigh(IP_NEIGH) == {
+        "10.1.1.1": ("00:11:22:33:44:55", True),
+        "10.1.1.4": ("00:11:22:33:44:66", False),
+        "10.1.1.6": ("00:11:22:33:44:77", True),
+        "fe80::1": ("00:11:22:33:44:88", True),
+    }
+
+def test_failing_snmp_node_is_skipped(monkeypatch, capsys):
+    tables = {
+        MEDIA: [(f"{MEDIA}.3.10.1.1.7", FakeOctets(b"\x00\x11\x22\x33\x44\x55"))],
+        PHYSICAL: [(f"{PHYSICAL}.3.1.4.10.1.1.8", FakeOctets(b"\x00\x11\x22\x33\x44\x66"))],
+        FDB: [(f"{FDB}.0.17.34.51.68.119", 1)],
+    }
+    def snmp_bulk_walk(ip, community, oid):
+        if ip == "10.1.1.253":
+            raise RuntimeError("no SNMP response")
+        return tables[oid]
+    monkeypatch.setitem(sys.modules, "snmp", types.SimpleNamespace(snmp_bulk_walk=snmp_bulk_walk))
+
+    neighbors, fdb_macs = host_disco.read_snmp_neighbors([("10.1.1.253", "public"), ("10.1.1.254", "public")])
+    assert neighbors == {"10.1.1.7": ("00:11:22:33:44:55", False), "10.1.1.8": ("00:11:22:33:44:66", False)}
+    assert fdb_macs == {"00:11:22:33:44:77"}
+    assert "SNMP neighbor walk of 10.1.1.253 failed: no SNMP response" in capsys.readouterr().out
@@ -0,0 +1,132 @@
+# tests/test_httpmon.py
+#
+# HTTP/HTTPS checks against a local ThreadingHTTPServer: keep-alive reuse, status and body checks,
+# the MAX_BODY close path, retry on a stale idle connection and TLS session resumption.
+# cert.pem/key.pem next to this file are a self-signed localhost certificate for the TLS server.
+
+import os
+import ssl
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+import httpmon
+import moni
+from statusapi import StatusTable
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive unless a path says otherwise
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        if isinstance(self.connection, ssl.SSLSocket):
+            self.server.session_reused.append(self.connection.session_reused)
+        headers = {}
+        if self.path == "/missing":
+            code, body = 404, b"not here"
+        elif self.path == "/big":
+            code, body = 200, b"x" * (httpmon.MAX_BODY * 2)
+        elif self.path == "/close":
+            code, body = 200, b"bye"
+            headers["Connection"] = "close"
+        else:
+            code, body = 200, b"hello world"
+        if self.path == "/drop":
+            # Looks like keep-alive to the client, but the server closes the connection once idle
+            self.close_connection = True
+        self.send_response(code)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_server(tls=False):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.session_reused = []
+    if tls:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(os.path.join(HERE, "cert.pem"), os.path.join(HERE, "key.pem"))
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+@pytest.fixture(params=["http", "https"])
+def server(request):
+    server = start_server(tls=request.param == "https")
+    server.base = f"{request.param}://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def pool():
+    pool = httpmon.HTTPPool()
+    yield pool
+    pool.close()
+
+def test_checks_reuse_one_connection(server, pool):
+    assert all(httpmon.http_monitor(server.base + "/ok", pool=pool) for _ in range(5))
+    assert server.connections == 1
+
+def test_expected_status(server, pool):
+    assert not httpmon.http_monitor(server.base + "/missing", pool=pool)
+    assert httpmon.http_monitor(server.base + "/missing", 404, pool=pool)
+
+def test_body_substring(server, pool):
+    assert httpmon.http_monitor(server.base + "/ok", 200, "hello", pool=pool)
+    assert not httpmon.http_monitor(server.base + "/ok", 200, "goodbye", pool=pool)
+
+def test_body_over_max_closes_connection(server, pool):
+    status, body = pool.request(server.base + "/big")
+    assert status == 200
+    assert len(body) == httpmon.MAX_BODY
+    assert not any(pool.idle.values())
+    assert httpmon.http_monitor(server.base + "/ok", pool=pool)
+    assert server.connections == 2
+
+def test_stale_idle_connection_is_retried(server, pool):
+    assert httpmon.http_monitor(server.base + "/drop", pool=pool)
+    assert sum(len(connections) for connections in pool.idle.values()) == 1
+    time.sleep(0.1)  # Let the server close its end
+    assert httpmon.http_monitor(server.base + "/ok", pool=pool)
+    assert server.connections == 2
+
+@pytest.mark.parametrize("version", [ssl.TLSVersion.TLSv1_2, ssl.TLSVersion.TLSv1_3])
+def test_tls_session_resumed_after_connection_close(pool, version):
+    server = start_server(tls=True)
+    server.socket.context.maximum_version = version
+    url = f"https://127.0.0.1:{server.server_address[1]}/close"
+    try:
+        assert all(httpmon.http_monitor(url, pool=pool) for _ in range(3))
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert server.connections == 3
+    assert server.session_reused == [False, True, True]
+
+@pytest.mark.parametrize("entry", ["http://10.0.0.1:abc/", "http:///x", "http://10.0.0.1:99999/",
+                                   "ftp://10.0.0.1/", "http://10.0.0.1/ ok"])
+def test_bad_entry_raises_value_error(entry):
+    with pytest.raises(ValueError):
+        httpmon.parse_http_entry(entry)
+
+def test_bad_entry_does_not_stop_moni(capsys):
+    table = StatusTable()
+    assert moni.check_hosts(["http://10.0.0.1:abc/", "http:///x"], {}, table) == []
+    assert "Invalid HTTP check http://10.0.0.1:abc/" in capsys.readouterr().out
+    assert table.query()["checks"] == []
@@ -0,0 +1,214 @@
+# tests/test_probe.py
+#
+# collector and agents on loopback: assignment from agents.txt, logged results, spooling and alerts.
+# checks are TCP only (no ping binary needed): a listening port for OK, a refused port for Failed.
+
+import socket
+import threading
+import time
+
+import pytest
+
+import probe
+
+SECRET = b"test-secret"
+
+@pytest.fixture(autouse=True)
+def fast_cycles(monkeypatch):
+    monkeypatch.setattr(probe, "CHECK_INTERVAL", 0.05)
+
+@pytest.fixture
+def open_port():
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(50)
+    yield listener.getsockname()[1]
+    listener.close()
+
+@pytest.fixture
+def inventory(tmp_path, open_port):
+    nodes_file = tmp_path / "nodes.db"
+    agents_file = tmp_path / "agents.txt"
+    nodes_file.write_text(f"127.0.0.1:{open_port}\n127.0.0.2:1\n10.9.9.9:ICMP\n")
+    agents_file.write_text("a1 127.0.0.1\na2 127.0.0.2-127.0.0.2\n")
+    return str(nodes_file), str(agents_file), open_port
+
+def start_collector(tmp_path, inventory, port=0, secret=SECRET):
+    nodes_file, agents_file, _ = inventory
+    collector = probe.Collector(("127.0.0.1", port), str(tmp_path / "results.log"), secret,
+                                nodes_file=nodes_file, agents_file=agents_file)
+    threading.Thread(target=collector.serve_forever, daemon=True).start()
+    return collector
+
+def stop_collector(collector):
+    collector.shutdown()
+    collector.server_close()
+
+def logged(tmp_path):
+    time.sleep(0.1)  # Collector threads finish writing after the ack
+    return (tmp_path / "results.log").read_text().splitlines()
+
+def test_assignment_follows_agents_txt(inventory):
+    nodes_file, agents_file, open_port = inventory
+    assert probe.assigned_entries("a1", nodes_file, agents_file) == [f"127.0.0.1:{open_port}"]
+    assert probe.assigned_entries("a2", nodes_file, agents_file) == ["127.0.0.2:1"]
+    assert probe.assigned_entries("a3", nodes_file, agents_file) == []
+
+def test_agents_report_their_slice(tmp_path, inventory, monkeypatch):
+    monkeypatch.setattr(probe, "STALE_CYCLES", 1000)
+    open_port = inventory[2]
+    collector = start_collector(tmp_path, inventory)
+    port = collector.server_address[1]
+    agents = [probe.Agent(name, "127.0.0.1", SECRET, port, spool_dir=str(tmp_path / "spool")) for name in ("a1", "a2")]
+    threads = [threading.Thread(target=agent.run, kwargs={"cycles": 3}) for agent in agents]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    lines = logged(tmp_path)
+    stop_collector(collector)
+    assert agents[0].entries == [f"127.0.0.1:{open_port}"]
+    assert agents[1].entries == ["127.0.0.2:1"]
+    assert sum(line.endswith(f"- a1 - 127.0.0.1:{open_port} OK") for line in lines) == 3
+    assert sum(line.endswith("- a2 - 127.0.0.2:1 Failed") for line in lines) == 3
+    assert len(lines) == 6
+    assert collector.down_nodes() == ["127.0.0.2:1 (via a2)"]
+
+def test_agent_with_only_arp_entries_is_not_silent(tmp_path):
+    nodes_file = tmp_path / "nodes.db"
+    agents_file = tmp_path / "agents.txt"
+    nodes_file.write_text("127.0.0.5:ARP\n")
+    agents_file.write_text("a1 127.0.0.5\n")
+    inventory = (str(nodes_file), str(agents_file), None)
+    collector = start_collector(tmp_path, inventory)
+    agent = probe.Agent("a1", "127.0.0.1", SECRET, collector.server_address[1], spool_dir=str(tmp_path / "spool"))
+    agent.run(cycles=10)
+    down_nodes = collector.down_nodes()
+    lines = logged(tmp_path)
+    stop_collector(collector)
+    assert agent.entries == ["127.0.0.5:ARP"]
+    assert down_nodes == []
+    assert lines == []  # Nothing checked, nothing logged
+    assert agent.spooled_batches() == []
+
+def test_wrong_secret_is_rejected(tmp_path, inventory):
+    collector = start_collector(tmp_path, inventory)
+    agent = probe.Agent("a1", "127.0.0.1", b"wrong", collector.server_address[1], spool_dir=str(tmp_path / "spool"))
+    assert not agent.connect()
+    assert agent.entries == []
+    stop_collector(collector)
+
+def test_oversized_frame_is_rejected(tmp_path, inventory):
+    collector = start_collector(tmp_path, inventory)
+    with socket.create_connection(collector.server_address) as sock:
+        sock.sendall(b"n" * probe.NONCE_SIZE)
+        probe.recv_exact(sock, probe.NONCE_SIZE)
+        sock.sendall(b"\xff\xff\xff\xff")
+        assert sock.recv(1) == b""  # Dropped without reading 4 GiB
+    stop_collector(collector)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def test_spool_while_down_and_flush_on_reconnect(tmp_path, inventory):
+    open_port = inventory[2]
+    agent = probe.Agent("a1", "127.0.0.1", SECRET, free_port(), spool_dir=str(tmp_path / "spool"))
+    agent.entries = [f"127.0.0.1:{open_port}"]
+    agent.run(cycles=3)
+    assert len(agent.spooled_batches()) == 3
+
+    collector = start_collector(tmp_path, inventory)
+    agent.address = ("127.0.0.1", collector.server_address[1])
+    assert agent.connect()
+    agent.disconnect()
+    assert agent.spooled_batches() == []
+    lines = logged(tmp_path)
+    stop_collector(collector)
+    assert len(lines) == 3
+    assert all(line.endswith(f"- a1 - 127.0.0.1:{open_port} OK") for line in lines)
+
+def test_interrupted_flush_does_not_resend(tmp_path, inventory):
+    agent = probe.Agent("a1", "127.0.0.1", SECRET, free_port(), spool_dir=str(tmp_path / "spool"))
+    for i in range(3):
+        agent.spool([{"ts": time.time(), "entry": f"127.0.0.1:{i}", "ok": True, "detail": ""}])
+
+    collector = start_collector(tmp_path, inventory)
+    record = collector.record
+    calls = []
+    def drop_second(agent_name, results):
+        calls.append(results)
+        if len(calls) == 2:
+            raise ConnectionError("connection lost")
+        record(agent_name, results)
+    collector.record = drop_second
+    agent.address = ("127.0.0.1", collector.server_address[1])
+    assert not agent.connect()
+    assert len(agent.spooled_batches()) == 2  # First batch was acked and deleted
+
+    collector.record = record
+    assert agent.connect()
+    agent.disconnect()
+    lines = logged(tmp_path)
+    stop_collector(collector)
+    assert agent.spooled_batches() == []
+    assert [line.split(" - ")[-1] for line in lines] == ["127.0.0.1:0 OK", "127.0.0.1:1 OK", "127.0.0.1:2 OK"]
+
+def test_collector_that_never_acks(tmp_path, inventory, monkeypatch):
+    monkeypatch.setattr(probe, "REPLY_TIMEOUT", 0.3)
+    open_port = inventory[2]
+    collector = start_collector(tmp_path, inventory)
+    release = threading.Event()
+    collector.record = lambda agent_name, results: release.wait(10)  # Stuck collector, connection stays open
+    agent = probe.Agent("a1", "127.0.0.1", SECRET, collector.server_address[1], spool_dir=str(tmp_path / "spool"))
+    thread = threading.Thread(target=agent.run, kwargs={"cycles": 3})
+    thread.start()
+    thread.join(timeout=10)
+    release.set()
+    stop_collector(collector)
+    assert not thread.is_alive()
+    assert agent.entries == [f"127.0.0.1:{open_port}"]
+    assert len(agent.spooled_batches()) == 3  # Every cycle ran and was spooled
+
+def test_collector_drops_idle_agents(tmp_path, inventory, monkeypatch):
+    monkeypatch.setattr(probe, "IDLE_TIMEOUT", 0.3)
+    collector = start_collector(tmp_path, inventory)
+    agent = probe.Agent("a1", "127.0.0.1", SECRET, collector.server_address[1], spool_dir=str(tmp_path / "spool"))
+    assert agent.connect()
+    agent.sock.settimeout(5)
+    try:
+        assert agent.sock.recv(1) == b""  # Closed by the collector, not by the 5 s deadline
+    finally:
+        agent.disconnect()
+        stop_collector(collector)
+
+def test_spool_is_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(probe, "SPOOL_MAX_BYTES", 200)
+    agent = probe.Agent("a1", "127.0.0.1", SECRET, free_port(), spool_dir=str(tmp_path / "spool"))
+    for i in range(20):
+        agent.spool([{"entry": f"{i}" * 100}])
+    batches = agent.spooled_batches()
+    assert 0 < len(batches) < 20
+    assert batches[-1] == "000000000020.batch"  # Oldest are dropped, newest kept
+
+def test_silent_agents_alert(tmp_path, inventory, monkeypatch):
+    collector = start_collector(tmp_path, inventory)
+    collector.record("a1", [{"ts": time.time(), "entry": "127.0.0.1:1", "ok": True, "detail": ""}])
+    assert collector.down_nodes() == []
+
+    later = time.time() + probe.STALE_CYCLES * probe.CHECK_INTERVAL + 1
+    down_nodes = collector.down_nodes(later)
+    assert any(node.startswith("agent a1 (no report") for node in down_nodes)
+    assert any(node.startswith("agent a2 (no report") for node in down_nodes)
+
+    sent = []
+    monkeypatch.setattr(probe, "beep", lambda: None)
+    monkeypatch.setattr(probe, "send_alert_email", lambda subject, message: sent.append(message))
+    monkeypatch.setattr(probe, "SMTP_ENABLED", True)
+    collector.alert(down_nodes)
+    collector.alert(down_nodes)  # Rate limited like moni.py
+    stop_collector(collector)
+    assert len(sent) == 1
+    assert "agent a2" in sent[0]
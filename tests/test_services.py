@@ -0,0 +1,52 @@
+# tests/test_services.py
+#
+# banner classification and fingerprinting of a port on the socket that found it open.
+
+import socket
+import threading
+
+import pytest
+
+from services import classify_banner, identify_service, tls_client_hello
+
+@pytest.mark.parametrize("banner, port, service", [
+    (b"SSH-2.0-OpenSSH_9.6\r\n", 22, "ssh"),
+    (b"+OK POP3 ready\r\n", 110, "pop3"),
+    (b"* OK IMAP4rev1 ready\r\n", 143, "imap"),
+    (b"220 mail.example.com ESMTP Postfix\r\n", 25, "smtp"),
+    (b"220 (vsFTPd 3.0.5)\r\n", 21, "ftp"),
+    (b"220 ProFTPD Server ready\r\n", 2121, "ftp"),
+    (b"HTTP/1.1 200 OK\r\n", 8080, "http"),
+    (b"\x16\x03\x03\x00\x7a\x02", 443, "tls"),
+    (b"\x15\x03\x01\x00\x02\x02\x28", 8443, "tls"),  # Alert, e.g. a handshake failure
+    (b"", 9999, None),
+    (b"\x00\x01garbage", 9999, None),
+])
+def test_classify_banner(banner, port, service):
+    assert classify_banner(banner, port) == service
+
+def test_client_hello_is_a_tls_record():
+    assert tls_client_hello()[:2] == b"\x16\x03"
+
+@pytest.mark.parametrize("port, greeting, reply, service", [
+    (22, b"SSH-2.0-test\r\n", b"", "ssh"),  # Greeting port, server talks first
+    (8080, b"", b"HTTP/1.0 200 OK\r\n\r\n", "http"),  # HEAD sent straight away
+    (8081, b"", b"", None),  # Silent port
+])
+def test_identify_service(port, greeting, reply, service):
+    client, server = socket.socketpair()
+    def serve():
+        if greeting:
+            server.sendall(greeting)
+        else:
+            server.settimeout(2)
+            if server.recv(1024).startswith(b"HEAD ") and reply:
+                server.sendall(reply)
+    thread = threading.Thread(target=serve)
+    thread.start()
+    try:
+        assert identify_service(client, port) == service
+    finally:
+        thread.join()
+        client.close()
+        server.close()
@@ -0,0 +1,56 @@
+# tests/test_statusapi.py
+#
+# status table and API on loopback: SNMP results pushed by snmp.py and pruning of removed entries.
+
+import json
+import urllib.request
+
+import pytest
+
+from statusapi import StatusTable, start_api, push_snmp_values
+
+SNMP_ENTRY = "10.1.1.147:SNMP:public:qnap.txt"
+
+@pytest.fixture
+def api():
+    table = StatusTable()
+    server = start_api(table, 0)
+    yield table, server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+def status(port, **params):
+    query = "&".join(f"{key}={value}" for key, value in params.items())
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/status?{query}", timeout=2) as response:
+        return json.load(response)
+
+def test_snmp_status_follows_poll_errors(api):
+    table, port = api
+    push_snmp_values(SNMP_ENTRY, "10.1.1.147", {"1.3.6.1.2.1.1.3.0": "42"}, True, port)
+    [record] = status(port, host="10.1.1.147")["checks"]
+    assert (record["check"], record["type"], record["status"]) == (SNMP_ENTRY, "snmp", "up")
+    assert record["snmp"] == {"1.3.6.1.2.1.1.3.0": "42"}
+
+    version = table.version
+    error = "SNMP GET error for 10.1.1.147: No SNMP response received before timeout"
+    push_snmp_values(SNMP_ENTRY, "10.1.1.147", {"1.3.6.1.2.1.1.3.0": error}, False, port)
+    [record] = status(port, type="snmp")["checks"]
+    assert record["status"] == "down"
+    assert table.changes_since(version)["checks"][0]["check"] == SNMP_ENTRY
+
+def test_bad_snmp_push_is_rejected(api):
+    table, port = api
+    request = urllib.request.Request(f"http://127.0.0.1:{port}/snmp", data=json.dumps({"host": "10.1.1.147"}).encode())
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(request, timeout=2)
+    assert error.value.code == 400
+    assert table.checks == {}
+
+def test_prune_removes_snmp_checks():
+    table = StatusTable()
+    table.update("10.1.1.4:22:ssh", "10.1.1.4", "ssh", True)
+    table.update_snmp(SNMP_ENTRY, "10.1.1.147", {}, True)
+    table.prune({"10.1.1.4:22:ssh"})
+    assert list(table.checks) == ["10.1.1.4:22:ssh"]
+    assert table.changes_since(table.version - 1)["checks"] == [{"check": SNMP_ENTRY, "status": "removed",
+                                                                  "version": table.version}]
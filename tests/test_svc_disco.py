@@ -0,0 +1,33 @@
+# tests/test_svc_disco.py
+#
+# nodes.db updates from a port scan. svc-disco.py has a dash in its name, so it is imported with importlib.
+
+import importlib
+import os
+
+svc_disco = importlib.import_module("svc-disco")
+
+def test_save_open_ports_upgrades_and_appends(tmp_path):
+    nodes_file = tmp_path / "nodes.db"
+    nodes_file.write_text("10.1.1.4\n10.1.1.4:22\n10.1.1.4:443:tls\n10.1.1.5:80\nhttp://10.1.1.4:8080/health\n")
+    svc_disco.save_open_ports([("10.1.1.4", 22, "ssh"), ("10.1.1.4", 443, "http"), ("10.1.1.5", 80, None),
+                               ("10.1.1.6", 25, "smtp"), ("10.1.1.6", 9999, None)], str(nodes_file))
+    assert nodes_file.read_text().splitlines() == [
+        "10.1.1.4",
+        "10.1.1.4:22:ssh",  # Bare entry gets its service
+        "10.1.1.4:443:tls",  # Existing service type is kept
+        "10.1.1.5:80",  # Nothing identified, stays bare
+        "http://10.1.1.4:8080/health",
+        "10.1.1.6:25:smtp",
+        "10.1.1.6:9999",
+    ]
+    assert not os.path.exists(str(nodes_file) + ".tmp")
+
+def test_save_open_ports_replaces_the_file(tmp_path):
+    # Written to nodes.db.tmp and renamed, a reader holding the old file never sees it truncated
+    nodes_file = tmp_path / "nodes.db"
+    nodes_file.write_text("10.1.1.4:22\n")
+    with open(nodes_file) as reader:
+        svc_disco.save_open_ports([("10.1.1.4", 22, "ssh")], str(nodes_file))
+        assert reader.read() == "10.1.1.4:22\n"
+    assert nodes_file.read_text() == "10.1.1.4:22:ssh\n"